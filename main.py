@@ -1,17 +1,47 @@
-import json
+import gzip
+import orjson
+import pickle
 import spacy
 import os
-import string
-import numpy as np
-from sklearn.feature_extraction.text import CountVectorizer
-from nltk.stem import PorterStemmer
+import re
+from collections import Counter
+from joblib import Memory
+from sklearn.feature_extraction.text import HashingVectorizer
 from wordcloud import WordCloud
+import matplotlib
+
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 from sklearn.feature_extraction.text import TfidfVectorizer
 import logging
 
+try:
+    import Stemmer
+
+    _STEMMER = Stemmer.Stemmer("polish")
+except ImportError:
+    import snowballstemmer
+
+    _STEMMER = snowballstemmer.stemmer("polish")
+
 logging.basicConfig(level=logging.INFO)
 
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+_BATCH_SIZE = 128
+_N_PROCESS = os.cpu_count()
+_N_FEATURES = 2**18
+_WRITE_BUFFER_SIZE = 1 << 20
+_MEMORY = Memory("results/.cache", verbose=0)
+_DEBUG = os.environ.get("DEBUG", "") not in ("", "0")
+_LEMMATIZER_PIPES = [
+    "tok2vec",
+    "morphologizer",
+    "tagger",
+    "attribute_ruler",
+    "lemmatizer",
+]
+
 
 def read_data_from_file(file_path):
     """
@@ -23,14 +53,14 @@ def read_data_from_file(file_path):
     Returns:
     - dict or list: The parsed data from the JSON file.
 
-    Opens the specified JSON file in read mode with UTF-8 encoding.
-    Parses the JSON content using the `json.load` function.
+    Opens the specified JSON file in binary read mode.
+    Parses the raw bytes using the `orjson.loads` function.
     Closes the file automatically using the 'with' statement.
     Returns the parsed data, which can be a dictionary or a list.
     """
 
-    with open(file_path, "r", encoding="utf-8") as json_file:
-        data = json.load(json_file)
+    with open(file_path, "rb") as json_file:
+        data = orjson.loads(json_file.read())
     return data
 
 
@@ -45,105 +75,91 @@ def create_corpus(data):
     - list: A list of preprocessed and lowercased opinions without punctuation.
 
     Iterates through each item in the provided data list.
-    For each opinion in the "opinions" key of the item, removes punctuation using
-    string.punctuation and converts the opinion to lowercase.
-    Appends the preprocessed opinion to the corpus list.
+    For each opinion in the "opinions" key of the item, removes every character that is
+    neither a word character nor whitespace (including Polish quotation marks, dashes and
+    emoji) and converts the opinion to lowercase.
     Returns the resulting text corpus.
     """
 
-    corpus = []
-    for item in data:
-        for opinion in item["opinions"]:
-            opinion_without_punctuation = "".join(
-                char for char in opinion if char not in string.punctuation
-            )
-            lowercase_opinion = opinion_without_punctuation.lower()
-            corpus.append(lowercase_opinion)
+    corpus = [
+        _PUNCT_RE.sub("", opinion).lower()
+        for item in data
+        for opinion in item["opinions"]
+    ]
     return corpus
 
 
-def tokenize(corpus, nlp):
+def process_corpus(corpus, nlp, stop_words, pipes=_LEMMATIZER_PIPES, model=None):
     """
-    Tokenizes the given text corpus using a natural language processing (NLP) pipeline.
+    Tokenizes, lemmatizes and filters the given text corpus in a single NLP pipeline pass.
 
     Parameters:
-    - corpus (list): A list of text strings to be tokenized.
-    - nlp (spacy.Language): The Spacy NLP pipeline used for tokenization.
+    - corpus (list): A list of text strings to be processed.
+    - nlp (spacy.Language): The Spacy NLP pipeline used for tokenization and lemmatization.
+    - stop_words (set): A set of lowercased stop words.
+    - pipes (list, optional): The pipeline components to run. Defaults to the components
+      required by the lemmatizer.
+    - model (tuple, optional): The spaCy version and the language, name and version of the
+      model behind nlp. Not used for processing; it identifies the model in the disk cache
+      key, since nlp itself is not hashed.
 
     Returns:
-    - list: A flat list of tokens extracted from the input corpus.
-
-    Tokenizes each text string in the provided corpus using the specified NLP pipeline.
-    Extends the 'tokens' list with the individual token texts from each processed document.
-    Returns the resulting flat list of tokens.
+    - tuple: A tuple of three flat lists - tokens, their lemmas, and the lemmas with
+             stop words filtered out.
+
+    Processes each unique text of the provided corpus once, in batches, using only the
+    given pipeline components. For each token, collects its text and
+    lemma, and keeps the lemma in the filtered list if its lowercased form is not a stop
+    word. Lemmas are lowercased for the comparison because the lemmatizer's lookup tables
+    can return capitalized lemmas even for lowercased input.
+    The results are then expanded back in corpus order, so duplicated texts contribute
+    their tokens as many times as they occur.
     """
 
-    tokens = []
+    unique_corpus = list(dict.fromkeys(corpus))
+    processed = {}
+    with nlp.select_pipes(enable=pipes):
+        docs = nlp.pipe(unique_corpus, batch_size=_BATCH_SIZE, n_process=_N_PROCESS)
+        for text, doc in zip(unique_corpus, docs):
+            doc_tokens = [token.text for token in doc]
+            doc_lemmas = [token.lemma_ for token in doc]
+            doc_filtered = [
+                lemma for lemma in doc_lemmas if lemma.lower() not in stop_words
+            ]
+            processed[text] = (doc_tokens, doc_lemmas, doc_filtered)
+
+    tokens, lemmas, filtered_tokens = [], [], []
     for text in corpus:
-        doc = nlp(text)
-        tokens.extend([token.text for token in doc])
-    return tokens
-
-
-def remove_stop_words(tokens, nlp):
-    """
-    Removes stop words from a list of tokens using a natural language processing (NLP) pipeline.
-
-    Parameters:
-    - tokens (list): A list of tokens from which stop words will be removed.
-    - nlp (spacy.Language): The Spacy NLP pipeline used for stop word identification.
-
-    Returns:
-    - list: A list of tokens with stop words filtered out.
-
-    Removes stop words from the input list of tokens based on the stop words provided by the
-    specified NLP pipeline. The resulting list contains only tokens that are not stop words.
-    """
-
-    stop_words = nlp.Defaults.stop_words
-    filtered_tokens = [token for token in tokens if token.lower() not in stop_words]
-    return filtered_tokens
-
-
-def lemmatize(tokens, nlp):
-    """
-    Lemmatizes a list of tokens using a natural language processing (NLP) pipeline.
-
-    Parameters:
-    - tokens (list): A list of tokens to be lemmatized.
-    - nlp (spacy.Language): The Spacy NLP pipeline used for lemmatization.
-
-    Returns:
-    - list: A list of lemmas corresponding to the input tokens.
-
-    Lemmatizes each token in the input list using the specified NLP pipeline.
-    The resulting list contains lemmas corresponding to each token in the input list.
-    """
-
-    doc = nlp(" ".join(tokens))
-    lemmas = [token.lemma_ for token in doc]
-    return lemmas
+        doc_tokens, doc_lemmas, doc_filtered = processed[text]
+        tokens.extend(doc_tokens)
+        lemmas.extend(doc_lemmas)
+        filtered_tokens.extend(doc_filtered)
+    return tokens, lemmas, filtered_tokens
 
 
 def stem_text(tokens):
     """
-    Stems a list of tokens using the Porter stemming algorithm.
+    Stems a list of tokens using the Snowball Polish stemming algorithm.
 
     Parameters:
     - tokens (list): A list of tokens to be stemmed.
 
     Returns:
-    - list: A list of stemmed tokens using the Porter stemming algorithm.
+    - list: A list of stemmed tokens using the Snowball Polish stemming algorithm.
 
-    Stems each token in the input list using the Porter stemming algorithm.
+    Stems the whole input list in a single call to the Snowball Polish stemmer
+    (PyStemmer's C binding to libstemmer, or the pure-Python snowballstemmer if
+    PyStemmer is not installed).
     The resulting list contains stemmed versions of each token in the input list.
     """
 
-    stemmer = PorterStemmer()
-    stemmed_tokens = [stemmer.stem(token) for token in tokens]
+    stemmed_tokens = _STEMMER.stemWords(tokens)
     return stemmed_tokens
 
 
+cached_process_corpus = _MEMORY.cache(process_corpus, ignore=["nlp"])
+
+
 def analyze_and_visualize(corpus, top_percentage=5):
     """
     Analyzes and visualizes the given text corpus.
@@ -154,7 +170,7 @@ def analyze_and_visualize(corpus, top_percentage=5):
 
     Performs the following analyses and visualizations:
     1. Prints the total number of words and unique words in the corpus.
-    2. Generates and displays a word cloud based on the entire corpus.
+    2. Generates a word cloud based on the word frequencies of the entire corpus.
     3. Creates a bar chart displaying the top words and their frequencies.
 
     Saves the generated visualizations as PNG files in the 'results' directory.
@@ -164,62 +180,58 @@ def analyze_and_visualize(corpus, top_percentage=5):
     Returns:
     - None
     """
-    flattened_tokens = [token for token in corpus]
-
-    word_count = len(flattened_tokens)
-    unique_words = len(set(flattened_tokens))
+    word_count = len(corpus)
+    unique_words = len(set(corpus))
     print(f"Total Words: {word_count}")
     print(f"Unique Words: {unique_words}")
 
-    wordcloud = WordCloud(width=800, height=400).generate(" ".join(flattened_tokens))
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation="bilinear")
-    plt.axis("off")
-    plt.savefig("results/7_visualize_1.png", bbox_inches="tight")
-    plt.show()
+    word_frequencies = Counter(token for token in corpus if not token.isspace())
 
-    count_vectorizer = CountVectorizer()
-
-    count_matrix = count_vectorizer.fit_transform(corpus)
-
-    vocabulary = count_vectorizer.get_feature_names_out()
-    word_frequencies = count_matrix.sum(axis=0).A1
-
-    top_word_indices = (-word_frequencies).argsort()[
-        : int(top_percentage / 100 * len(vocabulary))
-    ]
-
-    top_words = [vocabulary[i] for i in top_word_indices]
-    top_frequencies = word_frequencies[top_word_indices]
-
-    plt.figure(figsize=(10, 6))
-    plt.bar(range(len(top_words)), top_frequencies, tick_label=top_words)
-    plt.xlabel("Słowa")
-    plt.ylabel("Częstość występowania")
-    plt.title(f"Top {top_percentage}% najczęściej występujących słów w tekście")
-    plt.xticks(rotation=45, ha="right", fontsize=8)
-    plt.tight_layout()
-    plt.savefig("results/7_visualize_2.png", bbox_inches="tight")
-    plt.show()
-
-
-def vectorize_text(corpus):
+    wordcloud = WordCloud(width=800, height=400).generate_from_frequencies(
+        word_frequencies
+    )
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.imshow(wordcloud, interpolation="bilinear")
+    ax.axis("off")
+    fig.savefig("results/7_visualize_1.png", bbox_inches="tight")
+    plt.close(fig)
+
+    top_count = max(1, int(top_percentage / 100 * len(word_frequencies)))
+    top_words, top_frequencies = zip(*word_frequencies.most_common(top_count))
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.bar(range(len(top_words)), top_frequencies, tick_label=top_words)
+    ax.set_xlabel("Słowa")
+    ax.set_ylabel("Częstość występowania")
+    ax.set_title(f"Top {top_percentage}% najczęściej występujących słów w tekście")
+    plt.setp(ax.get_xticklabels(), rotation=45, ha="right", fontsize=8)
+    fig.tight_layout()
+    fig.savefig("results/7_visualize_2.png", bbox_inches="tight")
+    plt.close(fig)
+
+
+def vectorize_text(data):
     """
-    Vectorizes a text corpus using the CountVectorizer.
+    Vectorizes the opinions from a list of items using the HashingVectorizer.
 
     Parameters:
-    - corpus (list): A list of text strings to be vectorized.
+    - data (list): A list of items, each containing an "opinions" key with a list of opinions.
 
     Returns:
     - scipy.sparse.csr.csr_matrix: A sparse matrix representing the vectorized text.
 
-    Uses the CountVectorizer to convert the input list of text strings into a
-    sparse matrix representation, where each row corresponds to a document in
-    the corpus and each column corresponds to a unique word in the vocabulary.
+    Uses the stateless HashingVectorizer to convert the raw opinions into a sparse matrix
+    of word counts, where each row corresponds to an opinion and each column corresponds
+    to a hashed word bucket. No vocabulary is built. The vectorizer lowercases the text
+    and its token pattern skips punctuation, so the opinions do not need to go through
+    create_corpus first.
     """
 
-    vectorizer = CountVectorizer()
-    vectorized_text = vectorizer.fit_transform(corpus)
+    opinions = [opinion for item in data for opinion in item["opinions"]]
+    vectorizer = HashingVectorizer(
+        n_features=_N_FEATURES, lowercase=True, alternate_sign=False, norm=None
+    )
+    vectorized_text = vectorizer.transform(opinions)
     return vectorized_text
 
 
@@ -238,24 +250,69 @@ def write_tokens_to_file(file_path, tokens):
     Returns:
     - None
 
-    Writes each token in the input list to the specified text file, separating tokens
-    with newline characters. Logs information about the file writing process using
-    the logging module, indicating the file path when the operation is successful.
+    Streams each token in the input list to the specified text file through a buffered
+    writer, terminating every token with a newline character. Logs information about
+    the file writing process using the logging module, indicating the file path when
+    the operation is successful.
+    """
+    with open(file_path, "w", encoding="utf-8", buffering=_WRITE_BUFFER_SIZE) as file:
+        file.writelines(f"{token}\n" for token in tokens)
+    logging.info(f"File written: {file_path}")
+
+
+def write_tokens_to_pickle(file_path, tokens):
+    """
+    Writes a list of tokens to a gzip-compressed pickle file.
+
+    Parameters:
+    - file_path (str): The path to the output .pkl.gz file.
+    - tokens (list): A list of tokens to be written to the file.
+
+    Returns:
+    - None
+
+    Pickles the input list with protocol 5 and compresses it with gzip at a low
+    compression level, which keeps the file small without slowing the write down.
+    Logs information about the file writing process using the logging module.
     """
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write("\n".join(["".join(token) for token in tokens]))
+    with gzip.open(file_path, "wb", compresslevel=3) as file:
+        pickle.dump(tokens, file, protocol=5)
     logging.info(f"File written: {file_path}")
 
 
+def save_tokens(name, tokens):
+    """
+    Saves a list of tokens as an intermediate result in the 'results' directory.
+
+    Parameters:
+    - name (str): The base name of the output file, without extension.
+    - tokens (list): A list of tokens to be saved.
+
+    Returns:
+    - None
+
+    Always writes the tokens to 'results/<name>.pkl.gz'. When the DEBUG environment
+    variable is set, also writes them to 'results/<name>.txt' for inspection.
+    """
+    write_tokens_to_pickle(f"results/{name}.pkl.gz", tokens)
+    if _DEBUG:
+        write_tokens_to_file(f"results/{name}.txt", tokens)
+
+
 def process_data():
     """
     Process data from an input JSON file, perform text preprocessing, and visualize the results.
 
     Reads data from the specified JSON file containing opinions.
     Utilizes Spacy for natural language processing, including tokenization, lemmatization, and stop word removal.
+    The NLP results are cached in 'results/.cache' and reused as long as the corpus,
+    the pipeline components and the spaCy model do not change. Only the most recently
+    used cache entry is kept.
     Creates and saves intermediate results, including a text corpus, tokenized text, lemmatized text, stemmed text,
     filtered text, and visualizations of word cloud and top word frequencies.
-    Finally, vectorizes the text corpus using CountVectorizer and saves the result to a file.
+    Intermediate token lists are saved as .pkl.gz files, and additionally as .txt files
+    when the DEBUG environment variable is set.
+    Finally, vectorizes the raw opinions using HashingVectorizer and saves the result to a file.
 
     Parameters:
     - None
@@ -267,34 +324,28 @@ def process_data():
     data = read_data_from_file(file_path)
 
     nlp = spacy.load("pl_core_news_sm")
-    nlp.max_length = 2500000
+    # A plain set, not a frozenset: joblib hashes sets in sorted order, which keeps
+    # the cache key stable across runs with different string hash seeds.
+    stop_words = set(map(str.lower, nlp.Defaults.stop_words))
 
     corpus = create_corpus(data)
-    write_tokens_to_file("results/2_corpus.txt", corpus)
-
-    tokens = tokenize(corpus, nlp)
-    write_tokens_to_file(
-        "results/3_tokenized.txt", ["".join(token) for token in tokens]
-    )
+    save_tokens("2_corpus", corpus)
 
-    lemmatized_tokens = lemmatize(tokens, nlp)
-    write_tokens_to_file(
-        "results/4_lemmatized.txt", ["".join(token) for token in lemmatized_tokens]
+    model = (spacy.__version__, nlp.lang, nlp.meta["name"], nlp.meta["version"])
+    tokens, lemmatized_tokens, filtered_tokens = cached_process_corpus(
+        corpus, nlp, stop_words, _LEMMATIZER_PIPES, model
     )
+    _MEMORY.reduce_size(items_limit=1)
+    save_tokens("3_tokenized", tokens)
+    save_tokens("4_lemmatized", lemmatized_tokens)
 
     stemmed_tokens = stem_text(tokens)
-    write_tokens_to_file(
-        "results/5_stemmed.txt", ["".join(token) for token in stemmed_tokens]
-    )
-
-    filtered_tokens = remove_stop_words(lemmatized_tokens, nlp)
-    write_tokens_to_file(
-        "results/6_filtered.txt", ["".join(token) for token in filtered_tokens]
-    )
+    save_tokens("5_stemmed", stemmed_tokens)
+    save_tokens("6_filtered", filtered_tokens)
 
     analyze_and_visualize(filtered_tokens, top_percentage=0.3)
 
-    vectorized_text = vectorize_text(corpus)
+    vectorized_text = vectorize_text(data)
     with open("results/8_vectorized.txt", "w") as file:
         file.write(str(vectorized_text))
 
@@ -1,147 +1,230 @@
-import requests
-import json
+import asyncio
+import httpx
+import orjson
 import os
-from bs4 import BeautifulSoup
+import re
+from selectolax.lexbor import LexborHTMLParser
 
+try:
+    import brotli  # noqa: F401
 
-def fetch_page(session, url):
+    ACCEPT_ENCODING = "gzip, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip"
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+BASE_URL = "https://www.wakacje.pl"
+MAX_CONNECTIONS = 16
+MAX_CONCURRENT_REQUESTS = 8
+REQUEST_TIMEOUT = 10.0
+HEADERS = {
+    "Accept-Encoding": ACCEPT_ENCODING,
+    "User-Agent": "Mozilla/5.0 (compatible; wakacje-opinions-scraper)",
+}
+
+
+async def fetch_page(client, semaphore, url):
     """
-    Fetches the content of a web page using the provided session and URL.
+    Fetches the content of a web page using the provided client and URL.
 
     Parameters:
-    - session (requests.Session): A requests session object for making HTTP requests.
+    - client (httpx.AsyncClient): An asynchronous httpx client for making HTTP requests.
+    - semaphore (asyncio.Semaphore): A semaphore limiting the number of concurrent requests.
     - url (str): The URL of the web page to fetch.
 
     Returns:
-    - BeautifulSoup: A BeautifulSoup object containing the parsed HTML content of the page.
+    - LexborHTMLParser: A selectolax LexborHTMLParser object containing the parsed HTML content of the page.
 
+    The raw response bytes are passed to the parser, which detects the encoding from the page itself.
     If an error occurs during the HTTP request, the function prints an error message and returns None.
     """
 
     try:
-        print(f"Fetching {url}")
-        response = session.get(url)
-        response.raise_for_status()
-        return BeautifulSoup(response.text, "html.parser")
-    except requests.RequestException as e:
+        async with semaphore:
+            print(f"Fetching {url}")
+            response = await client.get(url)
+            response.raise_for_status()
+        return LexborHTMLParser(response.content, encoding=True)
+    except httpx.HTTPError as e:
         print(f"Error fetching {url}: {e}")
         return None
 
 
-def parse_hotel_links(soup):
+def parse_hotel_links(tree):
     """
-    Extracts hotel links from the frequently rated section of a BeautifulSoup object.
+    Extracts hotel links from the frequently rated section of a LexborHTMLParser object.
 
     Parameters:
-    - soup (BeautifulSoup): A BeautifulSoup object representing the parsed HTML content.
+    - tree (LexborHTMLParser): A LexborHTMLParser object representing the parsed HTML content.
 
     Returns:
     - list: A list of modified hotel URLs extracted from the frequently rated section.
             If no frequently rated section is found, an empty list is returned.
 
-    The function searches for a specific div with class "swiper-wrapper" in the provided soup.
+    The function searches for a specific div with class "swiper-wrapper" in the provided tree.
     If found, it extracts all 'a' tags within that div, modifies the URLs, and returns the list.
     If the frequently rated section is not found, it prints a message and returns an empty list.
     """
 
-    frequently_rated = soup.find("div", class_="swiper-wrapper")
-    if not frequently_rated:
+    frequently_rated = tree.css_first("div.swiper-wrapper")
+    if frequently_rated is None:
         print("No frequently rated section found.")
         return []
 
     print("Parsing hotel links.")
-    offer_links = frequently_rated.find_all("a")
+    offer_links = frequently_rated.css("a")
     urls = []
     for link in offer_links:
-        parts = link.get("href").split("/")
+        parts = link.attributes.get("href").split("/")
         url = "https://www.wakacje.pl/opinie/hotele/" + "/".join(parts[3:])
         index_href = url.rfind("-")
         urls.append(url[: index_href + 1] + "h" + url[index_href + 1 :])
     return urls
 
 
-def extract_opinions(soup):
+def extract_opinions(tree):
     """
-    Extracts opinions from the specified section of a BeautifulSoup object.
+    Extracts opinions from the specified section of a LexborHTMLParser object.
 
     Parameters:
-    - soup (BeautifulSoup): A BeautifulSoup object representing the parsed HTML content.
+    - tree (LexborHTMLParser): A LexborHTMLParser object representing the parsed HTML content.
 
     Returns:
     - list: A list of strings containing extracted opinions.
             If no opinions list is found, an empty list is returned.
 
-    The function looks for a specific div with class "opinions__list" in the provided soup.
+    The function looks for a specific div with class "opinions__list" in the provided tree.
     If found, it extracts all 'p' tags with class "opinion__attributes-content" within that div,
     retrieves the text content of each tag, and returns the list of opinions.
     If the opinions list is not found, it prints a message and returns an empty list.
     """
 
-    opinions_list = soup.find("div", class_="opinions__list")
-    if not opinions_list:
+    opinions_list = tree.css_first("div.opinions__list")
+    if opinions_list is None:
         print("No opinions list found.")
         return []
 
     print("Extracting opinions...")
-    opinions = opinions_list.find_all("p", class_="opinion__attributes-content")
-    return [opinion.get_text(strip=True) for opinion in opinions]
+    opinions = opinions_list.css("p.opinion__attributes-content")
+    return [opinion.text(strip=True) for opinion in opinions]
+
+
+def parse_page_urls(tree):
+    """
+    Builds the URLs of the following paginated pages from the pagination widget.
+
+    Parameters:
+    - tree (LexborHTMLParser): A LexborHTMLParser object representing a page of opinions.
 
+    Returns:
+    - list: A list of URLs from the next page up to the highest page number listed in
+            the pagination widget. An empty list is returned if there is no next page.
+
+    The function takes the "next page" link and the page numbers listed in the pagination
+    widget, then substitutes every page number from the next page to the highest listed one
+    into the "next page" link. If the link does not end with a page number listed in the
+    widget, only the "next page" link itself is returned, so the caller walks the pages
+    one by one. The widget may not list the last page, so the caller should check the last
+    fetched page for further pages.
+    """
+
+    next_page = tree.css_first("li.pagination__item--next a")
+    if next_page is None:
+        return []
 
-def scrape_hotel_opinions(session, url):
+    next_page_href = str(next_page.attributes.get("href"))
+    page_numbers = [
+        int(item.text(strip=True))
+        for item in tree.css("li.pagination__item")
+        if item.text(strip=True).isdigit()
+    ]
+    page_number = re.search(r"(\d+)(\D*)$", next_page_href)
+    if page_number is None or int(page_number.group(1)) not in page_numbers:
+        return [BASE_URL + next_page_href]
+
+    href_prefix = next_page_href[: page_number.start(1)]
+    return [
+        BASE_URL + href_prefix + str(page) + page_number.group(2)
+        for page in range(int(page_number.group(1)), max(page_numbers) + 1)
+    ]
+
+
+async def scrape_hotel_opinions(client, semaphore, url):
     """
     Scrapes hotel opinions from the specified URL and its paginated pages.
 
     Parameters:
-    - session (requests.Session): A requests session object for making HTTP requests.
+    - client (httpx.AsyncClient): An asynchronous httpx client for making HTTP requests.
+    - semaphore (asyncio.Semaphore): A semaphore limiting the number of concurrent requests.
     - url (str): The URL of the hotel page to scrape opinions from.
 
     Returns:
     - list: A list of strings containing scraped opinions.
             If an error occurs during the scraping process, an empty list is returned.
 
-    The function fetches the HTML content of the provided URL using the given session.
+    The function fetches the HTML content of the provided URL using the given client.
     It then extracts opinions from the initial page using the extract_opinions function.
-    If pagination is detected, the function iterates through paginated pages and extracts
-    opinions from each page. The final list of opinions is returned.
+    If pagination is detected, the pages listed in the pagination widget are fetched
+    concurrently and their opinions are appended in page order. This repeats from the last
+    fetched page for as long as it still links to a next page. The final list of opinions
+    is returned.
     """
 
     print(
         "---------------------------------------------------------------------------------------"
     )
     print(f"Scraping opinions for {url}")
-    soup = fetch_page(session, url)
-    if not soup:
+    tree = await fetch_page(client, semaphore, url)
+    if tree is None:
         return []
 
-    opinions = extract_opinions(soup)
-    next_page = soup.find("li", class_="pagination__item--next")
-
-    while next_page:
-        next_page_url = "https://www.wakacje.pl" + str(next_page.find("a").get("href"))
-        soup = fetch_page(session, next_page_url)
-        if soup:
-            opinions.extend(extract_opinions(soup))
-            next_page = soup.find("li", class_="pagination__item--next")
-        else:
+    opinions = extract_opinions(tree)
+    page_urls = parse_page_urls(tree)
+
+    while page_urls:
+        pages = await asyncio.gather(
+            *(fetch_page(client, semaphore, page_url) for page_url in page_urls)
+        )
+        for page in pages:
+            if page is not None:
+                opinions.extend(extract_opinions(page))
+        if pages[-1] is None:
             break
+        page_urls = parse_page_urls(pages[-1])
     return opinions
 
 
-def main():
-    url = "https://www.wakacje.pl/hotele/"
+async def main():
+    url = BASE_URL + "/hotele/"
     data = []
 
-    with requests.Session() as session:
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS)
+    timeout = httpx.Timeout(REQUEST_TIMEOUT)
+    async with httpx.AsyncClient(
+        http2=HTTP2, headers=HEADERS, limits=limits, timeout=timeout
+    ) as client:
         print(f"Fetching main page: {url}")
-        soup = fetch_page(session, url)
-        if soup:
-            hotel_urls = parse_hotel_links(soup)
-            for hotel_url in hotel_urls:
-                opinions = scrape_hotel_opinions(session, hotel_url)
+        tree = await fetch_page(client, semaphore, url)
+        if tree is not None:
+            hotel_urls = parse_hotel_links(tree)
+            hotels_opinions = await asyncio.gather(
+                *(
+                    scrape_hotel_opinions(client, semaphore, hotel_url)
+                    for hotel_url in hotel_urls
+                )
+            )
+            for hotel_url, opinions in zip(hotel_urls, hotels_opinions):
                 data.append({"hotel_url": hotel_url, "opinions": opinions})
 
-    with open("results/1_opinions.json", "w", encoding="utf-8") as json_file:
-        json.dump(data, json_file, ensure_ascii=False, indent=4)
+    with open("results/1_opinions.json", "wb") as json_file:
+        json_file.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
     print(f"")
     print(f"Opinions saved to file '1_opinions.py'!")
     print(f"")
@@ -150,4 +233,4 @@ def main():
 if __name__ == "__main__":
     if not os.path.exists("results"):
         os.makedirs("results")
-    main()
+    asyncio.run(main())